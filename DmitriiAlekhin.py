@@ -1,11 +1,19 @@
-from random import random, randint, sample
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from os import listdir, curdir
-from re import match, sub
+from itertools import chain
+from multiprocessing import get_context
+from os import cpu_count
+from glob import glob
+from re import fullmatch, match, sub
 from sys import argv
 
 import mido
-import music21
+import numpy as np
+
+RNG = np.random.default_rng()
+"""
+Random numbers generator shared by all random operators of the evolutionary algorithm
+"""
 
 
 class Note:
@@ -15,6 +23,8 @@ class Note:
     https://www.music.mcgill.ca/~ich/classes/mumt306/StandardMIDIfileformat.html
     """
 
+    __slots__ = ('midi_value', 'octave_value', 'octave', 'start_delay', 'playtime')
+
     midi_value: int
     """
     MIDI note value, supports all MIDI values according to 
@@ -79,6 +89,9 @@ class Note:
     def __eq__(self, other: "Note"):
         return self.octave_value == other.octave_value
 
+    def __hash__(self):
+        return self.octave_value
+
     def __len__(self):
         return self.start_delay + self.playtime
 
@@ -88,23 +101,23 @@ class Mode(Enum):
     Chord and Key mode enum representation
     """
 
-    MAJOR = [0, 4, 7]
+    MAJOR = (0, 4, 7)
     """
-    Major mode with the list according to 0-4-7 rule:
+    Major mode with the tuple according to 0-4-7 rule:
     https://en.wikipedia.org/wiki/Triad_(music)#Construction
     ALSO USED as the mode of Key
     """
 
-    MINOR = [0, 3, 7]
+    MINOR = (0, 3, 7)
     """
-    Minor mode with the list according to 3/4 rule:
+    Minor mode with the tuple according to 3/4 rule:
     https://en.wikipedia.org/wiki/Triad_(music)#Construction
     ALSO USED as the mode of Key
     """
 
-    DIM = [0, 3, 6]
+    DIM = (0, 3, 6)
     """
-    Diminished mode with the list according to 3/4 rule:
+    Diminished mode with the tuple according to 3/4 rule:
     https://en.wikipedia.org/wiki/Triad_(music)#Construction
     NOT USED as the mode of Key
     """
@@ -115,16 +128,50 @@ class Chord:
     Triad chord representation class.
     """
 
+    __slots__ = (
+        'notes', 'octave_values', 'max_midi_value', 'min_midi_value', 'fingerprint',
+        'mode', 'playtime', 'is_inverted', 'is_second_inverted'
+    )
+
     __DISSONANT_DISTANCES = [0, 1, 2, 6, 9, 10, 11]
     """
     Dissonant distances
     """
 
+    __IS_DISSONANT = np.isin(np.minimum(np.arange(12), 12 - np.arange(12)), __DISSONANT_DISTANCES)[
+        (np.arange(12)[:, None] - np.arange(12)[None, :]) % 12
+    ]
+    """
+    Lookup table indexed by a pair of octave values,
+    True if the distance between them is dissonant (with respect to octave wrapping)
+    """
+
     notes: list[Note]
     """
     List of MIDI notes, length is always 3
     """
 
+    octave_values: np.ndarray
+    """
+    Octave values of the chord's notes, kept in sync with notes: list[Note]
+    """
+
+    max_midi_value: int
+    """
+    The highest MIDI value of the chord's notes
+    """
+
+    min_midi_value: int
+    """
+    The lowest MIDI value of the chord's notes
+    """
+
+    fingerprint: int
+    """
+    Octave values of the chord's notes packed into 4-bit fields,
+    chords are equal if and only if their fingerprints are equal
+    """
+
     mode: Mode
     """
     Chord mode: MAJOR, MINOR, or DIM
@@ -148,20 +195,34 @@ class Chord:
 
     def __init__(self, note: Note, mode: Mode, playtime: int = 384):
         """
-        Initializes a chord by the given first note and mode values list
+        Initializes a chord by the given first note and mode values tuple
         :param note: first note of the chord (index = 0)
-        :param mode: mode values list
+        :param mode: mode values tuple
         :param playtime: common playtime of all chord's notes
         """
-        if not isinstance(mode.value, list):
+        if not isinstance(mode.value, tuple):
             raise TypeError('Pattern value is not an iterable object')
 
-        chord_midi_values = (i + note.midi_value for i in mode.value)
-        self.notes = [Note(i, 0, playtime) for i in chord_midi_values]
+        midi_value = note.midi_value
+        self.notes = [Note(midi_value + i, 0, playtime) for i in mode.value]
         self.mode = mode
         self.playtime = playtime
         self.is_inverted = False
         self.is_second_inverted = False
+        self.__cache_values()
+
+    def __cache_values(self):
+        """
+        Rebuilds the chord's notes values used by the fitness functions,
+        must be called after each change of notes: list[Note]
+        """
+        self.octave_values = np.array([note.octave_value for note in self.notes], dtype=np.int8)
+        self.max_midi_value = max(note.midi_value for note in self.notes)
+        self.min_midi_value = min(note.midi_value for note in self.notes)
+
+        self.fingerprint = 0
+        for note in self.notes:
+            self.fingerprint = self.fingerprint << 4 | note.octave_value
 
     def fitness(
             self,
@@ -170,9 +231,9 @@ class Chord:
             dim_chord_penalty: int = 100,
             second_inverted_penalty: int = 200,
             perfect_chord_factor: int = 600,
-            too_high_chord_factor: int = 10e3,
+            too_high_chord_factor: int = 10_000,
             equal_note_factor: int = 600,
-            distance_factor: int = 10e5
+            distance_factor: int = 1_000_000
     ) -> int:
         """
         Fitness function for the chord (used in Progression's fitness function)
@@ -193,24 +254,18 @@ class Chord:
         value += -dim_chord_penalty if self.mode is Mode.DIM else dim_chord_penalty
         value += perfect_chord_factor if self in key_chords.perfect_chords else -perfect_chord_factor
 
-        value += -too_high_chord_factor if any(
-            note.midi_value >= playing_note.midi_value
-            for note in self.notes
-            for playing_note in playing_bar.notes
-        ) else too_high_chord_factor
+        value += -too_high_chord_factor \
+            if self.max_midi_value >= playing_bar.min_midi_value \
+            else too_high_chord_factor
 
-        for i in range(len(self.notes)):
-            for j in range(len(playing_bar.notes)):
-                if self.notes[i] == playing_bar.notes[j]:
-                    value += equal_note_factor * (len(self.notes) - j)
+        equal_notes = self.octave_values[:, None] == playing_bar.octave_values[None, :]
+        weights = len(self.notes) - np.arange(len(playing_bar.notes))
+        value += equal_note_factor * int((equal_notes * weights).sum())
 
-        distances = [
-            abs(playing_note.octave_value - note.octave_value)
-            for playing_note in playing_bar.notes for note in self.notes
-        ]
+        is_dissonant = Chord.__IS_DISSONANT[playing_bar.octave_values[:, None], self.octave_values[None, :]]
 
         value += -distance_factor \
-            if any(min(distance, abs(12 - distance)) in Chord.__DISSONANT_DISTANCES for distance in distances) \
+            if is_dissonant.any() \
             else distance_factor
 
         return value
@@ -221,17 +276,8 @@ class Chord:
         https://www.musikalessons.com/blog/2017/09/chord-inversions/
         :return: first inverse of the chord
         """
-        if self.mode == Mode.DIM:
-            raise TypeError('Chord is not invertible')
-
-        instance = Chord(self.notes[0], self.mode, self.playtime)
-        instance.notes = self.notes[1:]
-
-        root = self.notes[0]
-        instance.notes.append(Note(root.midi_value + 12, root.start_delay, root.playtime))
-        instance.is_inverted = True
-
-        return instance
+        root, second, third = self.notes
+        return self.__inverse([second, third, root.change_octave(1)], False)
 
     def second_inverse(self) -> "Chord":
         """
@@ -239,13 +285,34 @@ class Chord:
         https://www.musikalessons.com/blog/2017/09/chord-inversions/
         :return: first inverse of the chord with decremented octave
         """
-        instance = self.first_inverse().first_inverse()
-        instance.notes = [note.change_octave(-1) for note in instance.notes]
-        instance.is_second_inverted = True
+        root, second, third = self.notes
+        return self.__inverse([third.change_octave(-1), root, second], True)
+
+    def __inverse(self, notes: list[Note], is_second_inverted: bool) -> "Chord":
+        """
+        Builds an inverse of the chord from its already inverted notes, bypassing __init__
+        :param notes: notes of the inverse
+        :param is_second_inverted: True for the second inverse
+        :return: inverse of the chord
+        """
+        if self.mode == Mode.DIM:
+            raise TypeError('Chord is not invertible')
+
+        instance = Chord.__new__(Chord)
+        instance.notes = notes
+        instance.mode = self.mode
+        instance.playtime = self.playtime
+        instance.is_inverted = True
+        instance.is_second_inverted = is_second_inverted
+        instance.__cache_values()
+
         return instance
 
     def __eq__(self, other):
-        return isinstance(other, Chord) and self.notes == other.notes
+        return isinstance(other, Chord) and self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return self.fingerprint
 
 
 class KeyChords:
@@ -266,11 +333,32 @@ class KeyChords:
     Minor steps: https://en.wikipedia.org/wiki/Minor_scale#Intervals
     """
 
-    __SHARP_LITERALS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'C#', 'A', 'A#', 'B']
+    __SHARP_LITERALS = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
     """
     Note sharp literals
     """
 
+    __MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+    """
+    Krumhansl-Kessler major key profile:
+    https://en.wikipedia.org/wiki/Key_finding#Krumhansl-Schmuckler_algorithm
+    """
+
+    __MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+    """
+    Krumhansl-Kessler minor key profile:
+    https://en.wikipedia.org/wiki/Key_finding#Krumhansl-Schmuckler_algorithm
+    """
+
+    __KEY_PROFILES = np.concatenate([
+        profile[(np.arange(12)[None, :] - np.arange(12)[:, None]) % 12]
+        for profile in (__MAJOR_PROFILE, __MINOR_PROFILE)
+    ])
+    """
+    Profiles of all 24 keys: rows [0, 12) are major keys and rows [12, 24) are minor keys,
+    row's index modulo 12 is the octave value of the key's tonic
+    """
+
     __MAJOR_MODES = [Mode.MAJOR, Mode.MINOR, Mode.MINOR, Mode.MAJOR, Mode.MAJOR, Mode.MINOR, Mode.DIM]
     """
     Roman numeral analysis for the major scale triads: 
@@ -298,12 +386,33 @@ class KeyChords:
     List of all possible good chords (chords from roman numeral analysis + their inverses)
     """
 
-    perfect_chords: list[Chord]
+    perfect_chords: frozenset[Chord]
     """
     A sample from chords: list[Chord] with equal mode, 
     e.g. for MINOR key it contains MINOR chords
     """
 
+    max_midi_values: np.ndarray
+    """
+    The highest MIDI value of each chord, shape is (len(chords),)
+    """
+
+    min_midi_values: np.ndarray
+    """
+    The lowest MIDI value of each chord, shape is (len(chords),)
+    """
+
+    equal_chords: np.ndarray
+    """
+    Chords' equality matrix, equal_chords[i, j] is True if chords[i] == chords[j],
+    shape is (len(chords), len(chords))
+    """
+
+    mode_matches: np.ndarray
+    """
+    Boolean flags indicating if the chord from chords: list[Chord] has the key's mode
+    """
+
     def __init__(self, melody: "Melody", literal: str, mode: Mode, playtime: int = 384):
         """
         Initializes all sufficiently good chords according to roman numeral analysis
@@ -330,12 +439,45 @@ class KeyChords:
         perfect_chords = list(filter(lambda chord: chord.mode is mode, chords))
         perfect_first_inverses = [chord.first_inverse() for chord in perfect_chords]
         perfect_second_inverses = [chord.second_inverse() for chord in perfect_chords]
-        self.perfect_chords = perfect_chords + perfect_first_inverses + perfect_second_inverses
+        self.perfect_chords = frozenset(perfect_chords + perfect_first_inverses + perfect_second_inverses)
 
         first_inverses = [chord.first_inverse() for chord in chords if chord.mode is not Mode.DIM]
         second_inverses = [chord.second_inverse() for chord in chords if chord.mode is not Mode.DIM]
         self.chords = chords + first_inverses + second_inverses
 
+        self.max_midi_values = np.array([chord.max_midi_value for chord in self.chords], dtype=np.int16)
+        self.min_midi_values = np.array([chord.min_midi_value for chord in self.chords], dtype=np.int16)
+        fingerprints = np.array([chord.fingerprint for chord in self.chords])
+        self.equal_chords = fingerprints[:, None] == fingerprints[None, :]
+        self.mode_matches = np.array([chord.mode == mode for chord in self.chords])
+
+    @staticmethod
+    def detect_key(melody: "Melody") -> tuple[str, Mode]:
+        """
+        Detects the key of the melody by Krumhansl-Schmuckler algorithm: correlates
+        the playtime-weighted histogram of octave values with the key profiles of all 24 keys
+        :param melody: input melody
+        :return: detected key literal and mode
+        """
+        octave_values = np.fromiter((note.octave_value for note in melody.notes), dtype=np.int64)
+        playtimes = np.fromiter((note.playtime for note in melody.notes), dtype=np.float64)
+        histogram = np.bincount(octave_values, weights=playtimes, minlength=12)
+
+        # an all-zero histogram has no variance, its NaN correlations are handled below
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlations = np.corrcoef(histogram, KeyChords.__KEY_PROFILES)[0, 1:]
+        key = int(np.nanargmax(correlations)) if not np.isnan(correlations).all() else 0
+
+        return KeyChords.__SHARP_LITERALS[key % 12], Mode.MAJOR if key < 12 else Mode.MINOR
+
+    def fitness_table(self, melody: "Melody") -> np.ndarray:
+        """
+        Evaluates the fitness of all chords against all bars of the melody
+        :param melody: input melody
+        :return: chords' fitness values, shape is (len(chords), len(melody.bars))
+        """
+        return np.array([[chord.fitness(self, bar) for bar in melody.bars] for chord in self.chords])
+
     def __str__(self):
         value = KeyChords.__SHARP_LITERALS[self.initial_note.octave_value]
         return value + 'm' if self.mode == Mode.MINOR else value
@@ -343,16 +485,30 @@ class KeyChords:
 
 class Progression:
     """
-    Triads chord progression
+    Triads chord progression, stored as indices of the chords from KeyChords
     """
 
-    chords: list[Chord]
+    key_chords: KeyChords
+    """
+    Key chords the progression is built from
+    """
+
+    indices: np.ndarray
     """
-    Chord progression list
+    Indices of the progression's chords in key_chords.chords: list[Chord],
+    stored as uint8 since there are at most 21 key chords
     """
 
-    def __init__(self, chords: list[Chord]):
-        self.chords = chords
+    def __init__(self, key_chords: KeyChords, indices: np.ndarray):
+        self.key_chords = key_chords
+        self.indices = indices
+
+    @property
+    def chords(self) -> list[Chord]:
+        """
+        Chord progression list
+        """
+        return [self.key_chords.chords[i] for i in self.indices]
 
     @staticmethod
     def random_progression(key_chords: KeyChords, melody: "Melody") -> "Progression":
@@ -362,12 +518,8 @@ class Progression:
         :param melody: input melody
         :return: random progression from key chords
         """
-        chords = [
-            key_chords.chords[randint(0, len(key_chords.chords) - 1)]
-            for _ in range(len(melody.bars))
-        ]
-
-        return Progression(chords)
+        indices = RNG.integers(0, len(key_chords.chords), len(melody.bars), dtype=np.uint8)
+        return Progression(key_chords, indices)
 
     @staticmethod
     def crossover(parent1: "Progression", parent2: "Progression", prob: float = 0.8) -> "Progression":
@@ -378,43 +530,77 @@ class Progression:
         :param prob: probability of replacement to second parent's chord
         :return: crossed progression from the given two parents
         """
-        chords = [
-            parent2.chords[i] if random() > prob else parent1.chords[i]
-            for i in range(min(len(parent1.chords), len(parent2.chords)))
-        ]
-
-        return Progression(chords)
+        length = min(len(parent1.indices), len(parent2.indices))
+        indices = Progression.population_crossover(parent1.indices[:length], parent2.indices[:length], prob)
+        return Progression(parent1.key_chords, indices)
 
-    def mutate(self, key_chords: KeyChords, invoke_prob: float = 0.1, swap_prob: float = 0.1) -> "Progression":
+    def mutate(self, invoke_prob: float = 0.1, swap_prob: float = 0.1) -> "Progression":
         """
         Swap mutation of the chord progression
-        :param key_chords: key chords
         :param invoke_prob: probability of invoke of mutation
         :param swap_prob: probability of swapping
         :return: self, but mutated
         """
-        if random() < invoke_prob:
-            for i in range(len(self.chords)):
-                if random() > swap_prob:
-                    random_index = randint(0, len(key_chords.chords) - 1)
-                    self.chords[i], self.chords[random_index] = self.chords[random_index], self.chords[i]
-
+        Progression.population_mutate(self.indices[None, :], invoke_prob, swap_prob)
         return self
 
+    @staticmethod
+    def population_crossover(
+            parents1: np.ndarray,
+            parents2: np.ndarray,
+            prob: float = 0.8,
+            draws: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Vectorized crossover for many pairs of progressions at once
+        :param parents1: first parents' chord indices, the last axis is the bars axis
+        :param parents2: second parents' chord indices, same shape as parents1
+        :param prob: probability of replacement to second parent's chord
+        :param draws: pre-drawn uniform random numbers, same shape as parents1 (drawn if None)
+        :return: crossed progressions' chord indices
+        """
+        if draws is None:
+            draws = RNG.random(parents1.shape)
+
+        return np.where(draws > prob, parents2, parents1)
+
+    @staticmethod
+    def population_mutate(population: np.ndarray, invoke_prob: float = 0.1, swap_prob: float = 0.1) -> np.ndarray:
+        """
+        In-place swap mutation for many progressions at once, random numbers are drawn
+        in batches and the swaps of each mutated progression are applied in order
+        :param population: progressions' chord indices, shape is (number of progressions, number of bars)
+        :param invoke_prob: probability of invoke of mutation
+        :param swap_prob: probability of swapping
+        :return: population, but mutated
+        """
+        length = population.shape[1]
+
+        for row in np.flatnonzero(RNG.random(len(population)) < invoke_prob):
+            progression = population[row]
+            random_indices = RNG.integers(0, length, length)
+
+            for i in np.flatnonzero(RNG.random(length) > swap_prob):
+                j = random_indices[i]
+                progression[i], progression[j] = progression[j], progression[i]
+
+        return population
+
     def fitness(
             self,
             key_chords: KeyChords,
             melody: "Melody",
-            perfect_chord_factor: int = 10e4,
+            perfect_chord_factor: int = 100_000,
             equal_key_chords_penalty: int = 1000,
             equal_key_chords_factor: int = 1000,
             preferred_distance: int = 6,
-            distance_factor: int = 10e6,
-            repetition_penalty: int = 10e8
+            distance_factor: int = 10_000_000,
+            repetition_penalty: int = 1_000_000_000,
+            fitness_table: np.ndarray = None
     ):
         """
         fitness function for the chord progression
-        :param key_chords: key chords
+        :param key_chords: key chords, must be the pool the progression's indices refer to
         :param melody: input melody
         :param perfect_chord_factor: multiplication factor for the output of chord's fitness function
         :param equal_key_chords_penalty: penalty for the chord with not equal mode
@@ -423,46 +609,79 @@ class Progression:
         notes between neighbor chords
         :param distance_factor: fit/miss factor for the good/bad distance
         :param repetition_penalty: penalty for repeated chord
+        :param fitness_table: precomputed result of key_chords.fitness_table(melody),
+        chords' fitness values are evaluated on the fly if not given
         :return: evaluation result for the chord progression
         """
-        value = 0
-        previous_chord = None
-
-        for i in range(len(self.chords)):
-            value += self.chords[i].fitness(key_chords, melody.bars[i]) * perfect_chord_factor
-
-            value += equal_key_chords_factor \
-                if (self.chords[i].mode == key_chords.mode) else -equal_key_chords_penalty
-
-            if previous_chord is not None:
-                max_midi_previous = max(note.midi_value for note in previous_chord.notes)
-                max_midi_current = max(note.midi_value for note in self.chords[i].notes)
-
-                min_midi_previous = min(note.midi_value for note in previous_chord.notes)
-                min_midi_current = min(note.midi_value for note in self.chords[i].notes)
-
-                value += distance_factor \
-                    if abs(max_midi_current - max_midi_previous) <= preferred_distance else -distance_factor
-
-                value += distance_factor \
-                    if abs(min_midi_previous - min_midi_current) <= preferred_distance else -distance_factor
+        if key_chords is not self.key_chords:
+            raise ValueError('Cannot evaluate progression: indices refer to another key chords pool')
 
-                if i != len(self.chords) - 1:
-                    next_chord = self.chords[i + 1]
+        return Progression.population_fitness(
+            self.indices, key_chords, melody,
+            perfect_chord_factor, equal_key_chords_penalty, equal_key_chords_factor,
+            preferred_distance, distance_factor, repetition_penalty, fitness_table
+        )
 
-                    max_midi_next = max(note.midi_value for note in next_chord.notes)
-                    min_midi_next = min(note.midi_value for note in next_chord.notes)
-
-                    value += distance_factor \
-                        if abs(max_midi_next - max_midi_previous) <= preferred_distance else -distance_factor
-
-                    value += distance_factor \
-                        if abs(min_midi_next - min_midi_current) <= preferred_distance else -distance_factor
-
-            if self.chords[i] == previous_chord:
-                value -= repetition_penalty
+    @staticmethod
+    def population_fitness(
+            population: np.ndarray,
+            key_chords: KeyChords,
+            melody: "Melody",
+            perfect_chord_factor: int = 100_000,
+            equal_key_chords_penalty: int = 1000,
+            equal_key_chords_factor: int = 1000,
+            preferred_distance: int = 6,
+            distance_factor: int = 10_000_000,
+            repetition_penalty: int = 1_000_000_000,
+            fitness_table: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Vectorized fitness function for many chord progressions at once, works on the chord indices only:
+        the last axis of population is the bars axis and all leading axes are preserved
+        :param population: indices of the progressions' chords in key_chords.chords: list[Chord]
+        :param key_chords: key chords
+        :param melody: input melody
+        :param perfect_chord_factor: see Progression.fitness
+        :param equal_key_chords_penalty: see Progression.fitness
+        :param equal_key_chords_factor: see Progression.fitness
+        :param preferred_distance: see Progression.fitness
+        :param distance_factor: see Progression.fitness
+        :param repetition_penalty: see Progression.fitness
+        :param fitness_table: see Progression.fitness
+        :return: evaluation results for the chord progressions
+        """
+        def distance_fitness(first: np.ndarray, second: np.ndarray):
+            fits = np.count_nonzero(np.abs(first - second) <= preferred_distance, axis=-1)
+            return distance_factor * (2 * fits - first.shape[-1])
+
+        bars = np.arange(population.shape[-1])
+        if fitness_table is None:
+            chords_fitness = np.reshape([
+                key_chords.chords[i].fitness(key_chords, melody.bars[j]) for i, j in np.broadcast(population, bars)
+            ], population.shape)
+        else:
+            chords_fitness = fitness_table[population, bars]
+
+        value = (chords_fitness * perfect_chord_factor).sum(axis=-1)
+
+        mode_matches = np.count_nonzero(key_chords.mode_matches[population], axis=-1)
+        value += equal_key_chords_factor * mode_matches
+        value -= equal_key_chords_penalty * (population.shape[-1] - mode_matches)
+
+        max_midi = key_chords.max_midi_values[population]
+        min_midi = key_chords.min_midi_values[population]
+
+        # neighbor chords
+        value += distance_fitness(max_midi[..., 1:], max_midi[..., :-1])
+        value += distance_fitness(min_midi[..., :-1], min_midi[..., 1:])
+
+        # previous and next chords around each inner chord
+        value += distance_fitness(max_midi[..., 2:], max_midi[..., :-2])
+        value += distance_fitness(min_midi[..., 2:], min_midi[..., 1:-1])
+
+        repetitions = key_chords.equal_chords[population[..., 1:], population[..., :-1]]
+        value -= repetition_penalty * np.count_nonzero(repetitions, axis=-1)
 
-            previous_chord = self.chords[i]
         return value
 
 
@@ -472,6 +691,8 @@ class Bar:
     this class represents the bars of the melody
     """
 
+    __slots__ = ('notes', 'octave_values', 'min_midi_value', '__length')
+
     TIME_SIGN = 384
     """
     Constant time signature
@@ -482,6 +703,17 @@ class Bar:
     Bar's notes list
     """
 
+    octave_values: np.ndarray
+    """
+    Octave values of the bar's notes, built by cache_values() once the bar is filled
+    """
+
+    min_midi_value: int
+    """
+    The lowest MIDI value of the bar's notes, 128 (above any MIDI value) for an empty bar,
+    built by cache_values() once the bar is filled
+    """
+
     __length: int
     """
     Bar's length (with respect to notes' delays)
@@ -506,8 +738,29 @@ class Bar:
         self.notes.append(note)
         self.__length += note.start_delay + note.playtime
 
+    def extend_notes(self, notes: list[Note]):
+        """
+        Appends the notes WITHOUT DELAYS to the bar, checking the bar length only once
+        """
+        length = sum(len(note) for note in notes)
+        if self.__length + length > Bar.TIME_SIGN:
+            raise ValueError('Bar length overflow error')
+
+        self.notes.extend(notes)
+        self.__length += length
+
+    def cache_values(self):
+        """
+        Builds the bar's notes values used by the fitness functions,
+        must be called after the last note is appended
+        """
+        self.octave_values = np.fromiter((note.octave_value for note in self.notes), np.int8, len(self.notes))
+        self.min_midi_value = min((note.midi_value for note in self.notes), default=128)
+
     def __init__(self):
         self.notes = []
+        self.octave_values = np.empty(0, dtype=np.int8)
+        self.min_midi_value = 128
         self.__length = 0
 
     def __len__(self):
@@ -529,55 +782,45 @@ class Melody:
     Bars list of the melody
     """
 
-    def __predicate(self, bar_index: int, note_index: int) -> bool:
-        """
-        Returns flag indicating if bar and note are still available
-        :param bar_index: current bar index
-        :param note_index: current note index
-        :return: flag indicating if bar and note are still available
-        """
-        return bar_index != len(self.bars) and note_index != len(self.notes)
-
     def __init__(self, notes: list[Note]):
         """
-        Initializes notes and bars
+        Initializes notes and bars. Notes' bounds are taken from the cumulative sum
+        of their lengths, notes crossing the bars' bounds are split between the bars
         :param notes: input notes from MIDI file
         """
         self.notes = notes
 
-        total_length = sum(len(note) for note in notes)
-        self.bars = [Bar() for _ in range(total_length // Bar.TIME_SIGN)]
-
-        bar_index = 0
-        note_index = 0
+        start_delays = np.fromiter((note.start_delay for note in notes), np.int64, len(notes))
+        playtimes = np.fromiter((note.playtime for note in notes), np.int64, len(notes))
+        ends = np.cumsum(start_delays + playtimes)
+        starts = ends - playtimes
 
-        while self.__predicate(bar_index, note_index):
-            current_note = self.notes[note_index]
-
-            start_delay = current_note.start_delay
-            playtime = current_note.playtime
+        total_length = int(ends[-1]) if len(notes) else 0
+        self.bars = [Bar() for _ in range(total_length // Bar.TIME_SIGN)]
+        bars_notes = [[] for _ in self.bars]
 
-            while start_delay != 0 and self.__predicate(bar_index, note_index):
-                remainder = Bar.TIME_SIGN - len(self.bars[bar_index])
-                if remainder == 0:
-                    bar_index += 1
-                    continue
+        first_bars = starts // Bar.TIME_SIGN
+        last_bars = (ends - 1) // Bar.TIME_SIGN
 
-                partial_playtime = min(remainder, start_delay)
-                self.bars[bar_index].append_delay(partial_playtime)
-                start_delay -= partial_playtime
+        for note, start, end, first_bar, last_bar in zip(
+                notes, starts.tolist(), ends.tolist(), first_bars.tolist(), last_bars.tolist()
+        ):
+            if start == end:
+                continue
 
-            while playtime != 0 and self.__predicate(bar_index, note_index):
-                remainder = Bar.TIME_SIGN - len(self.bars[bar_index])
-                if remainder == 0:
-                    bar_index += 1
-                    continue
+            if first_bar == last_bar < len(self.bars):
+                bars_notes[first_bar].append(Note(note.midi_value, 0, note.playtime))
+                continue
 
-                partial_playtime = min(remainder, playtime)
-                self.bars[bar_index].append_note(Note(current_note.midi_value, 0, partial_playtime))
-                playtime -= partial_playtime
+            for bar_index in range(first_bar, min(last_bar + 1, len(self.bars))):
+                bar_start = bar_index * Bar.TIME_SIGN
+                partial_playtime = min(end, bar_start + Bar.TIME_SIGN) - max(start, bar_start)
+                bars_notes[bar_index].append(Note(note.midi_value, 0, partial_playtime))
 
-            note_index += 1
+        for bar, bar_notes in zip(self.bars, bars_notes):
+            bar.extend_notes(bar_notes)
+            bar.append_delay(Bar.TIME_SIGN - len(bar))
+            bar.cache_values()
 
 
 class EvolutionaryAlgorithm:
@@ -594,7 +837,9 @@ class EvolutionaryAlgorithm:
             key_chords: KeyChords,
             generation_limit: int = 2000,
             population_size: int = 100,
-            selection_factor: int = 10
+            selection_factor: int = 10,
+            mutation_prob: float = 0.1,
+            name: str = 'melody'
     ) -> Progression:
         """
         Core implementation of evolutionary algorithm.
@@ -605,28 +850,52 @@ class EvolutionaryAlgorithm:
         :param generation_limit: limit of generations tested
         :param population_size: max size of the population
         :param selection_factor: how many survived progressions left
+        :param mutation_prob: probability of invoke of mutation for each child
+        :param name: name of the melody prefixing the progress messages
         :return: best progression
         """
-        print('Learning process started...')
-        population = [Progression.random_progression(key_chords, melody) for _ in range(population_size)]
+        print(f'[{name}] Learning process started...', flush=True)
+        fitness_table = key_chords.fitness_table(melody)
 
-        for i in range(generation_limit):
-            population = sorted(population, key=lambda p: p.fitness(key_chords, melody), reverse=True)
-            survived = population[0:selection_factor]
+        population = RNG.integers(0, len(key_chords.chords), (population_size, len(melody.bars)), dtype=np.uint8)
+        scores = Progression.population_fitness(population, key_chords, melody, fitness_table=fitness_table)
 
-            for _ in range(population_size - selection_factor):
-                random_index = randint(0, selection_factor - 1)
-                parent1, parent2 = tuple(sample(survived, 2))
-                survived += [survived[random_index].crossover(parent1, parent2).mutate(key_chords)]
+        for i in range(generation_limit):
+            survived = np.argpartition(scores, -selection_factor)[-selection_factor:]
+            population[:selection_factor] = population[survived]
+            scores[:selection_factor] = scores[survived]
+
+            # every child picks two distinct parents among the rows before it:
+            # the survivors and the children bred earlier in this generation
+            children = np.arange(selection_factor, population_size)
+            parents1 = (RNG.random(len(children)) * children).astype(np.int32)
+            parents2 = (RNG.random(len(children)) * (children - 1)).astype(np.int32)
+            parents2 += parents2 >= parents1
+
+            # random numbers of the whole generation are drawn at once,
+            # only mutated children step into the swap mutation
+            crossover_draws = RNG.random((len(children), population.shape[1]))
+            mutated = RNG.random(len(children)) < mutation_prob
+
+            for child, parent1, parent2, draws, is_mutated in zip(
+                    children, parents1, parents2, crossover_draws, mutated
+            ):
+                population[child] = Progression.population_crossover(
+                    population[parent1], population[parent2], draws=draws
+                )
+
+                if is_mutated:
+                    Progression.population_mutate(population[child:child + 1], invoke_prob=1)
 
             if i % 100 == 0:
-                print(f'Processed generation {i} of {generation_limit}')
+                print(f'[{name}] Processed generation {i} of {generation_limit}', flush=True)
 
-            population = survived
+            scores[selection_factor:] = Progression.population_fitness(
+                population[selection_factor:], key_chords, melody, fitness_table=fitness_table
+            )
 
-        population = sorted(population, key=lambda p: p.fitness(key_chords, melody), reverse=True)
-        print('Learning process ended.')
-        return population[0]
+        print(f'[{name}] Learning process ended.', flush=True)
+        return Progression(key_chords, population[np.argmax(scores)])
 
 
 class MidiHelper:
@@ -664,15 +933,11 @@ class MidiHelper:
         :param name: track name
         :param velocity: overridden velocity for all notes
         """
-        new_track = mido.MidiTrack()
-        new_track.append(mido.MetaMessage('track_name', name=name))
-        new_track.append(mido.Message('program_change', program=0, time=0))
-
-        for note in notes:
-            new_track += MidiHelper.__midi_event_pair(note, velocity=velocity)
-
-        new_track.append(mido.MetaMessage('end_of_track', time=0))
-        file.tracks.append(new_track)
+        file.tracks.append(mido.MidiTrack(chain(
+            [mido.MetaMessage('track_name', name=name), mido.Message('program_change', program=0, time=0)],
+            chain.from_iterable(MidiHelper.__midi_event_pair(note, velocity=velocity) for note in notes),
+            [mido.MetaMessage('end_of_track', time=0)]
+        )))
 
     @staticmethod
     def append_progression(file: mido.MidiFile, progression: Progression):
@@ -681,9 +946,11 @@ class MidiHelper:
         :param file: MIDI file
         :param progression: chord progression
         """
-        for i in range(len(progression.chords[0].notes)):
+        chords = progression.chords
+
+        for i in range(len(chords[0].notes)):
             MidiHelper.__append_track(
-                file, [chord.notes[i] for chord in progression.chords],
+                file, [chord.notes[i] for chord in chords],
                 name=f'chord_track{i}'
             )
 
@@ -694,15 +961,10 @@ class MidiHelper:
         :param file: input MIDI file
         :return: Melody instance
         """
-        all_notes = []
-
-        for track in file.tracks:
-            all_notes += [msg for msg in track]
-
         notes = []
         start_delay = 0
 
-        for msg in all_notes:
+        for msg in chain.from_iterable(file.tracks):
             if msg.type == 'note_on':
                 start_delay = msg.time
             elif msg.type == 'note_off':
@@ -711,24 +973,37 @@ class MidiHelper:
         return Melody(notes)
 
 
-filenames = sorted(filter(lambda x: match(r'input\d+\.mid', x), listdir(curdir))) \
-    if len(argv) <= 1 else argv[1:]
-
-for filename in filenames:
+def process_file(filename: str):
+    """
+    Harmonizes the melody from the given MIDI file and saves the result
+    with the best chord progression appended
+    :param filename: input MIDI file name
+    """
     input_file = mido.MidiFile(filename)
     input_melody = MidiHelper.melody(input_file)
-    print(f'Successfully parsed {filename}')
+    print(f'[{filename}] Successfully parsed', flush=True)
 
-    detected_key = music21.converter.parse(filename).analyze('key')
-    input_literal, pattern_str = detected_key.name.split()
-    print(f'Detected key: {input_literal} {pattern_str}')
+    input_literal, input_mode = KeyChords.detect_key(input_melody)
+    print(f'[{filename}] Detected key: {input_literal} {input_mode.name.lower()}', flush=True)
 
-    detected_key_chords = KeyChords(input_melody, input_literal, Mode[pattern_str.upper()])
-    best_progression = EvolutionaryAlgorithm.best_progression(input_melody, detected_key_chords)
+    detected_key_chords = KeyChords(input_melody, input_literal, input_mode)
+    best_progression = EvolutionaryAlgorithm.best_progression(input_melody, detected_key_chords, name=filename)
     MidiHelper.append_progression(input_file, best_progression)
 
     index_str = sub(r'\D', '', filename)
     index = int(index_str) if match(r'\d+', index_str) else filename.replace('.mid', '')
 
-    print(f'Output file is: DmitriiAlekhinOutput{index}-{detected_key_chords}.mid\n')
+    print(f'[{filename}] Output file is: DmitriiAlekhinOutput{index}-{detected_key_chords}.mid', flush=True)
     input_file.save(f'DmitriiAlekhinOutput{index}-{detected_key_chords}.mid')
+
+
+if __name__ == '__main__':
+    filenames = sorted(
+        filename for filename in glob('input[0-9]*.mid') if fullmatch(r'input\d+\.mid', filename)
+    ) if len(argv) <= 1 else argv[1:]
+
+    # files are independent, so they are spread over at most one worker per CPU;
+    # spawned workers import the module anew and get their own RNG seeds
+    workers = max(min(len(filenames), cpu_count() or 1), 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as executor:
+        list(executor.map(process_file, filenames))